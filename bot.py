@@ -12,11 +12,33 @@ import fitz  # PyMuPDF
 from collections import Counter
 import tempfile
 import shutil
+import zipfile
 from moviepy.editor import VideoFileClip, ImageClip, CompositeVideoClip, TextClip
 
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 ALLOWED_USER_ID = int(os.getenv('ALLOWED_USER_ID'))
 
+# Bot API upload limit; archives are split into parts below this size
+TELEGRAM_UPLOAD_LIMIT = 50 * 1024 * 1024
+# Formats that are already compressed and gain nothing from deflate
+STORED_EXTENSIONS = ('.pdf', '.mp4', '.mkv', '.mov', '.avi', '.webm', '.jpg', '.jpeg', '.png', '.zip')
+# Operations whose output mode can be switched, keyed by the menu they live in
+OUTPUT_OPERATIONS = {
+    'pdf_tools': [
+        ('deleted_pages', "🖼️ Delete by Image"),
+        ('watermarked', "📝 Watermark"),
+        ('inserted', "📄 Insert Page"),
+        ('replaced', "🔍 Find & Replace"),
+        ('renamed', "📛 Rename"),
+        ('thumbnails', "🎨 Create Thumbnail"),
+        ('no_thumbnails', "🗑️ Remove Thumbnail"),
+    ],
+    'video_tools': [
+        ('video_thumbnails', "🖼️ Set Thumbnail"),
+        ('watermarked_videos', "📝 Thumbnail + Watermark"),
+    ],
+}
+
 class PDFBot:
     def __init__(self):
         self.user_sessions = {}
@@ -29,7 +51,10 @@ class PDFBot:
                 'videos': [],
                 'mode': None,
                 'temp_data': {},
-                'common_words': []
+                'common_words': [],
+                'output_modes': {},
+                'page_range': None,
+                'doc_range': None
             }
         return self.user_sessions[user_id]
     
@@ -40,6 +65,210 @@ class PDFBot:
         session['videos'] = []
         session['temp_data'] = {}
         session['common_words'] = []
+        session['page_range'] = None
+        session['doc_range'] = None
+
+def range_bounds(spec):
+    """Check a spec like "1-5,10,-20:" and return its (first, last) pairs.
+
+    Numbers are 1-based, negative numbers count from the end and "a:b" is an
+    inclusive slice with either side optional (None). Raises ValueError on
+    bad syntax, an empty spec or a range whose start comes after its end.
+    """
+    bounds = []
+    for part in spec.replace(' ', '').split(','):
+        if not part:
+            continue
+        # int() alone would also accept "1_0", "+3" and non-ASCII digits
+        if not re.fullmatch(r'-?[0-9]+|[0-9]+-[0-9]+|(-?[0-9]+)?:(-?[0-9]+)?', part):
+            raise ValueError(f"Invalid range {part}")
+        if ':' in part:
+            first, last = part.split(':', 1)
+            first = int(first) if first else None
+            last = int(last) if last else None
+        elif '-' in part[1:]:
+            first, last = (int(n) for n in part.split('-'))
+        else:
+            first = last = int(part)
+        
+        if first == 0 or last == 0:
+            raise ValueError("Page numbers start at 1")
+        # Mixed signs depend on the page count, so only same-sign ranges are checked
+        if first is not None and last is not None and (first < 0) == (last < 0) and first > last:
+            raise ValueError(f"Range {part} starts after it ends")
+        bounds.append((first, last))
+    
+    if not bounds:
+        raise ValueError("Empty range")
+    return bounds
+
+def parse_ranges(spec, count):
+    """Turn a spec like "1-5,10,-20:" into sorted 0-based indices below count.
+
+    None or "all" selects everything. Ranges that fall outside the document
+    select nothing; callers report an empty selection.
+    """
+    if spec is None or spec.strip().lower() in ('', 'all'):
+        return list(range(count))
+    
+    def resolve(n):
+        return count + n if n < 0 else n - 1
+    
+    selected = set()
+    for first, last in range_bounds(spec):
+        start = resolve(first) if first is not None else 0
+        end = resolve(last) + 1 if last is not None else count
+        selected.update(range(max(start, 0), min(end, count)))
+    return sorted(selected)
+
+def selected_pdfs(session):
+    indices = parse_ranges(session['doc_range'], len(session['pdfs']))
+    return [session['pdfs'][i] for i in indices]
+
+def selected_pages(session, page_count):
+    return parse_ranges(session['page_range'], page_count)
+
+def batch_output(message, session, operation):
+    mode = session['output_modes'].get(operation, 'files')
+    return BatchOutput(message, mode, operation)
+
+def range_note(session, applied=True):
+    if not session['page_range'] and not session['doc_range']:
+        return ""
+    if not applied:
+        return "\n\nℹ️ Page/document range does not apply to this operation"
+    return f"\n\n🎯 Pages: {session['page_range'] or 'all'} · 📑 Documents: {session['doc_range'] or 'all'}"
+
+class BatchOutput:
+    """Sends the results of a batch either one by one or as streamed ZIP parts.
+
+    In 'zip' mode every result is written straight into an archive on disk,
+    so finished members are never kept in memory. A new part is started
+    whenever the next member would push the archive over the upload limit.
+    Use it as an async context manager so the open part is always sent and
+    removed, even when the batch stops early.
+    """
+    
+    def __init__(self, message, mode, archive_name, limit=TELEGRAM_UPLOAD_LIMIT):
+        self.message = message
+        self.mode = mode
+        self.archive_name = archive_name
+        self.limit = limit
+        self.part = 0
+        self.zip = None
+        self.zip_path = None
+        self.names = set()
+        self.central_size = 0
+        self.captions = []
+        self.failed = False
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is not None:
+                await self.message.reply_text(f"❌ Error: {self.archive_name} stopped early")
+        finally:
+            if self.zip is not None:
+                await self._flush(final=True)
+        return False
+    
+    async def add(self, filename, data=None, path=None, caption=None, video=False):
+        if self.mode != 'zip':
+            if path is not None:
+                with open(path, 'rb') as f:
+                    await self._send_file(f, filename, caption, video)
+            else:
+                await self._send_file(io.BytesIO(data), filename, caption, video)
+            return
+        
+        size = len(data) if data is not None else os.path.getsize(path)
+        # local header + data descriptor + central directory entry
+        overhead = 2 * len(filename.encode()) + 128
+        
+        # A part holding only this member would still be over the limit
+        if size + overhead + 22 > self.limit:
+            self.failed = True
+            await self.message.reply_text(
+                f"❌ Error: {filename} is too large to upload ({size / 1024 / 1024:.1f} MB)"
+            )
+            return
+        
+        filename = self._unique_name(filename)
+        if self.zip is not None and self._archive_size() + size + overhead > self.limit:
+            await self._flush(final=False)
+        if self.zip is None:
+            self._open_part()
+        
+        if filename.lower().endswith(STORED_EXTENSIONS):
+            compress_type = zipfile.ZIP_STORED
+        else:
+            compress_type = zipfile.ZIP_DEFLATED
+        
+        if path is not None:
+            self.zip.write(path, arcname=filename, compress_type=compress_type)
+        else:
+            self.zip.writestr(filename, data, compress_type=compress_type)
+        
+        self.central_size += 46 + len(filename.encode())
+        if caption:
+            self.captions.append(f"{filename}: {caption}")
+    
+    async def _send_file(self, fileobj, filename, caption, video):
+        if video:
+            await self.message.reply_video(video=fileobj, filename=filename, caption=caption)
+        else:
+            await self.message.reply_document(document=fileobj, filename=filename, caption=caption)
+    
+    def _unique_name(self, filename):
+        base, ext = os.path.splitext(filename)
+        candidate = filename
+        counter = 2
+        while candidate in self.names:
+            candidate = f"{base} ({counter}){ext}"
+            counter += 1
+        self.names.add(candidate)
+        return candidate
+    
+    def _archive_size(self):
+        # 22 bytes for the end of central directory record
+        return self.zip.fp.tell() + self.central_size + 22
+    
+    def _open_part(self):
+        self.part += 1
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as tmp_zip:
+            self.zip_path = tmp_zip.name
+        self.zip = zipfile.ZipFile(self.zip_path, 'w')
+        self.central_size = 0
+    
+    async def _flush(self, final):
+        try:
+            self.zip.close()
+        except Exception:
+            self.zip = None
+            os.unlink(self.zip_path)
+            self.zip_path = None
+            raise
+        self.zip = None
+        
+        if final and self.part == 1:
+            filename = f"{self.archive_name}.zip"
+        else:
+            filename = f"{self.archive_name}_part{self.part}.zip"
+        
+        caption = "\n".join(self.captions)[:1024] or None
+        self.captions = []
+        
+        try:
+            with open(self.zip_path, 'rb') as f:
+                await self.message.reply_document(document=f, filename=filename, caption=caption)
+        except Exception:
+            self.failed = True
+            await self.message.reply_text(f"❌ Error: {filename}")
+        finally:
+            os.unlink(self.zip_path)
+            self.zip_path = None
 
 bot_instance = PDFBot()
 
@@ -71,6 +300,15 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = query.data
     session = bot_instance.get_session(query.from_user.id)
     
+    if data.startswith('toggle_output:'):
+        _, menu, operation = data.split(':')
+        modes = session['output_modes']
+        modes[operation] = 'files' if modes.get(operation) == 'zip' else 'zip'
+        data = f'output_settings:{menu}'
+    
+    page_label = f"🎯 Pages: {session['page_range'] or 'all'}"
+    doc_label = f"📑 Documents: {session['doc_range'] or 'all'}"
+    
     if data == 'pdf_tools':
         keyboard = [
             [InlineKeyboardButton("📤 Upload PDFs", callback_data='upload_pdf')],
@@ -80,6 +318,9 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             [InlineKeyboardButton("🔍 Find & Replace", callback_data='find_replace')],
             [InlineKeyboardButton("📛 Rename Files", callback_data='rename_files')],
             [InlineKeyboardButton("🎨 Thumbnail Tools", callback_data='thumbnail_tools')],
+            [InlineKeyboardButton(page_label, callback_data='set_page_range')],
+            [InlineKeyboardButton(doc_label, callback_data='set_doc_range')],
+            [InlineKeyboardButton("📦 Output Settings", callback_data='output_settings:pdf_tools')],
             [InlineKeyboardButton("🔙 Back", callback_data='back_main')]
         ]
         await query.edit_message_text(
@@ -92,33 +333,49 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         session['mode'] = 'upload_pdf'
         await query.edit_message_text("📤 Send me PDF files (one or multiple)")
     
+    elif data == 'set_page_range':
+        session['mode'] = 'page_range'
+        await query.edit_message_text(
+            "🎯 Send pages to process:\n"
+            "Example: 1-5,10,-20:\n"
+            "(-20: = last 20 pages, all = every page)\n"
+            "Applies to watermark, find & replace and delete by image"
+        )
+    
+    elif data == 'set_doc_range':
+        session['mode'] = 'doc_range'
+        await query.edit_message_text(
+            "📑 Send PDF numbers to process (upload order):\n"
+            "Example: 1,3-4 or all"
+        )
+    
     elif data == 'delete_by_image':
         if not session['pdfs']:
             await query.edit_message_text("❌ No PDFs uploaded! Upload PDFs first.")
             return
         session['mode'] = 'delete_by_image'
-        await query.edit_message_text("🖼️ Send screenshot/image of page to delete")
+        await query.edit_message_text("🖼️ Send screenshot/image of page to delete" + range_note(session))
     
     elif data == 'add_watermark':
         if not session['pdfs']:
             await query.edit_message_text("❌ Upload PDFs first!")
             return
         session['mode'] = 'watermark_text'
-        await query.edit_message_text("📝 Send watermark text")
+        await query.edit_message_text("📝 Send watermark text" + range_note(session))
     
     elif data == 'insert_page':
         if not session['pdfs']:
             await query.edit_message_text("❌ Upload PDFs first!")
             return
         session['mode'] = 'insert_page_number'
-        await query.edit_message_text("📄 Send page number where to insert (e.g., 3)")
+        await query.edit_message_text("📄 Send page number where to insert (e.g., 3)" + range_note(session, applied=False))
     
     elif data == 'find_replace':
         if not session['pdfs']:
             await query.edit_message_text("❌ Upload PDFs first!")
             return
         
-        words = await extract_common_words(session['pdfs'])
+        words = await extract_common_words(session)
         session['common_words'] = words
         
         word_list = "\n".join([f"{i+1}. {word} ({count})" for i, (word, count) in enumerate(words[:20])])
@@ -127,7 +384,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         await query.edit_message_text(
             f"🔍 *Most Common Words:*\n\n{word_list}\n\n"
-            "Send word to find (or skip):",
+            "Send word to find (or skip):" + range_note(session),
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode='Markdown'
         )
@@ -135,7 +392,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     elif data == 'skip_suggestions':
         session['mode'] = 'find_word'
-        await query.edit_message_text("🔍 Send word to find:")
+        await query.edit_message_text("🔍 Send word to find:" + range_note(session))
     
     elif data == 'rename_files':
         if not session['pdfs']:
@@ -145,7 +402,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text(
             "📛 Send new name pattern:\n"
             "Use {n} for number\n"
-            "Example: Document_{n}"
+            "Example: Document_{n}" + range_note(session, applied=False)
         )
     
     elif data == 'thumbnail_tools':
@@ -164,7 +421,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_text("❌ Upload PDFs first!")
             return
         session['mode'] = 'create_thumbnail'
-        await query.edit_message_text("🖼️ Send square image for thumbnail")
+        await query.edit_message_text("🖼️ Send square image for thumbnail" + range_note(session, applied=False))
     
     elif data == 'remove_thumb':
         if not session['pdfs']:
@@ -177,6 +434,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             [InlineKeyboardButton("📤 Upload Videos", callback_data='upload_videos')],
             [InlineKeyboardButton("🖼️ Set Thumbnail", callback_data='set_video_thumb')],
             [InlineKeyboardButton("📝 Thumbnail + Watermark", callback_data='video_thumb_watermark')],
+            [InlineKeyboardButton("📦 Output Settings", callback_data='output_settings:video_tools')],
             [InlineKeyboardButton("🔙 Back", callback_data='back_main')]
         ]
         await query.edit_message_text(
@@ -203,6 +461,20 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         session['mode'] = 'video_thumb_watermark_image'
         await query.edit_message_text("🖼️ Send thumbnail image first")
     
+    elif data.startswith('output_settings:'):
+        menu = data.split(':', 1)[1]
+        keyboard = []
+        for operation, label in OUTPUT_OPERATIONS[menu]:
+            mode = "ZIP" if session['output_modes'].get(operation) == 'zip' else "Files"
+            keyboard.append([InlineKeyboardButton(f"{label}: {mode}", callback_data=f'toggle_output:{menu}:{operation}')])
+        keyboard.append([InlineKeyboardButton("🔙 Back", callback_data=menu)])
+        await query.edit_message_text(
+            "📦 *Output Settings*\n\n"
+            "Tap an operation to switch between separate files and one ZIP archive:",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
+    
     elif data == 'back_main':
         await start(update, context)
 
@@ -332,19 +604,40 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif session['mode'] == 'video_watermark_text':
         session['temp_data']['watermark_text'] = text
         await process_video_thumbnails_with_watermark(update, session, context)
+    
+    elif session['mode'] in ('page_range', 'doc_range'):
+        spec = text.strip()
+        if spec.lower() == 'all':
+            spec = None
+        else:
+            try:
+                range_bounds(spec)
+            except ValueError:
+                await update.message.reply_text("❌ Invalid range! Example: 1-5,10,-20: or all")
+                return
+        
+        key = session['mode']
+        session[key] = spec
+        session['mode'] = None
+        await update.message.reply_text(f"✅ {'Pages' if key == 'page_range' else 'Documents'}: {session[key] or 'all'}")
 
-async def extract_common_words(pdfs):
+async def extract_common_words(session):
     all_text = ""
-    for pdf_data in pdfs:
+    for pdf_data in selected_pdfs(session):
         doc = fitz.open(stream=pdf_data['data'], filetype="pdf")
-        for page in doc:
-            all_text += page.get_text()
+        for page_num in selected_pages(session, doc.page_count):
+            all_text += doc[page_num].get_text()
         doc.close()
     
     words = re.findall(r'\b[a-zA-Z]{3,}\b', all_text.lower())
     return Counter(words).most_common(30)
 
 async def process_delete_by_image(update, session, img_bytes):
+    if not selected_pdfs(session):
+        session['mode'] = None
+        await update.message.reply_text(f"❌ No uploaded PDFs match documents: {session['doc_range']}")
+        return
+    
     await update.message.reply_text("🔍 Searching for matching pages...")
     
     target_img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
@@ -353,86 +646,116 @@ async def process_delete_by_image(update, session, img_bytes):
     sift = cv2.SIFT_create()
     kp1, des1 = sift.detectAndCompute(target_gray, None)
     
-    for pdf_idx, pdf_data in enumerate(session['pdfs']):
-        doc = fitz.open(stream=pdf_data['data'], filetype="pdf")
-        writer = PdfWriter()
-        reader = PdfReader(io.BytesIO(pdf_data['data']))
-        
-        pages_to_keep = []
-        deleted_pages = []
-        
-        for page_num in range(len(reader.pages)):
-            pix = doc[page_num].get_pixmap(matrix=fitz.Matrix(2, 2))
-            img_data = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
-            
-            gray = cv2.cvtColor(img_data, cv2.COLOR_RGB2GRAY)
-            kp2, des2 = sift.detectAndCompute(gray, None)
-            
-            if des1 is not None and des2 is not None:
-                bf = cv2.BFMatcher()
-                matches = bf.knnMatch(des1, des2, k=2)
+    try:
+        async with batch_output(update.message, session, 'deleted_pages') as batch:
+            for pdf_idx, pdf_data in enumerate(selected_pdfs(session)):
+                doc = fitz.open(stream=pdf_data['data'], filetype="pdf")
+                page_count = doc.page_count
+                target_pages = selected_pages(session, page_count)
+                if not target_pages:
+                    doc.close()
+                    await update.message.reply_text(
+                        f"❌ Pages {session['page_range']} not in {pdf_data['name']} ({page_count} pages)"
+                    )
+                    continue
+                target_pages = set(target_pages)
+                
+                writer = PdfWriter()
+                reader = PdfReader(io.BytesIO(pdf_data['data']))
                 
-                good_matches = []
-                for m, n in matches:
-                    if m.distance < 0.75 * n.distance:
-                        good_matches.append(m)
+                pages_to_keep = []
+                deleted_pages = []
                 
-                if len(good_matches) > 50:
-                    deleted_pages.append(page_num + 1)
+                for page_num in range(len(reader.pages)):
+                    if page_num not in target_pages:
+                        writer.add_page(reader.pages[page_num])
+                        continue
+                    
+                    pix = doc[page_num].get_pixmap(matrix=fitz.Matrix(2, 2))
+                    img_data = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+                    
+                    gray = cv2.cvtColor(img_data, cv2.COLOR_RGB2GRAY)
+                    kp2, des2 = sift.detectAndCompute(gray, None)
+                    
+                    if des1 is not None and des2 is not None:
+                        bf = cv2.BFMatcher()
+                        matches = bf.knnMatch(des1, des2, k=2)
+                        
+                        good_matches = []
+                        for m, n in matches:
+                            if m.distance < 0.75 * n.distance:
+                                good_matches.append(m)
+                        
+                        if len(good_matches) > 50:
+                            deleted_pages.append(page_num + 1)
+                        else:
+                            writer.add_page(reader.pages[page_num])
+                    else:
+                        writer.add_page(reader.pages[page_num])
+                
+                doc.close()
+                
+                if deleted_pages:
+                    output = io.BytesIO()
+                    writer.write(output)
+                    
+                    await batch.add(
+                        f"deleted_{pdf_data['name']}",
+                        data=output.getvalue(),
+                        caption=f"✅ Deleted pages: {deleted_pages}"
+                    )
                 else:
-                    writer.add_page(reader.pages[page_num])
-            else:
-                writer.add_page(reader.pages[page_num])
-        
-        doc.close()
-        
-        if deleted_pages:
-            output = io.BytesIO()
-            writer.write(output)
-            output.seek(0)
-            
-            await update.message.reply_document(
-                document=output,
-                filename=f"deleted_{pdf_data['name']}",
-                caption=f"✅ Deleted pages: {deleted_pages}"
-            )
-        else:
-            await update.message.reply_text(f"❌ No matching pages in {pdf_data['name']}")
-    
-    session['mode'] = None
+                    await update.message.reply_text(f"❌ No matching pages in {pdf_data['name']}")
+    finally:
+        session['mode'] = None
 
 async def process_watermark(update, session, opacity):
+    if not selected_pdfs(session):
+        session['mode'] = None
+        await update.message.reply_text(f"❌ No uploaded PDFs match documents: {session['doc_range']}")
+        return
+    
     await update.message.reply_text("⚙️ Adding watermarks...")
     
     watermark_text = session['temp_data']['watermark_text']
+    processed = 0
+    try:
+        async with batch_output(update.message, session, 'watermarked') as batch:
+            for pdf_data in selected_pdfs(session):
+                doc = fitz.open(stream=pdf_data['data'], filetype="pdf")
+                page_count = doc.page_count
+                target_pages = selected_pages(session, page_count)
+                if not target_pages:
+                    doc.close()
+                    await update.message.reply_text(
+                        f"❌ Pages {session['page_range']} not in {pdf_data['name']} ({page_count} pages)"
+                    )
+                    continue
+                processed += 1
+                
+                for page_num in target_pages:
+                    page = doc[page_num]
+                    rect = page.rect
+                    text_width = len(watermark_text) * 5
+                    
+                    tw = fitz.TextWriter(rect)
+                    tw.append(
+                        (rect.width/2 - text_width/2, rect.height - 20),
+                        watermark_text,
+                        fontsize=10
+                    )
+                    tw.write_text(page, color=(0.5, 0.5, 0.5), opacity=opacity)
+                
+                output = io.BytesIO()
+                doc.save(output)
+                doc.close()
+                
+                await batch.add(f"watermarked_{pdf_data['name']}", data=output.getvalue())
+    finally:
+        session['mode'] = None
     
-    for pdf_data in session['pdfs']:
-        doc = fitz.open(stream=pdf_data['data'], filetype="pdf")
-        
-        for page in doc:
-            rect = page.rect
-            text_width = len(watermark_text) * 5
-            
-            tw = fitz.TextWriter(rect)
-            tw.append(
-                (rect.width/2 - text_width/2, rect.height - 20),
-                watermark_text,
-                fontsize=10
-            )
-            tw.write_text(page, color=(0.5, 0.5, 0.5), opacity=opacity)
-        
-        output = io.BytesIO()
-        doc.save(output)
-        doc.close()
-        output.seek(0)
-        
-        await update.message.reply_document(
-            document=output,
-            filename=f"watermarked_{pdf_data['name']}"
-        )
-    
-    session['mode'] = None
-    await update.message.reply_text("✅ Watermarks added!")
+    if processed and not batch.failed:
+        await update.message.reply_text("✅ Watermarks added!")
 
 async def process_insert_page(update, session):
     await update.message.reply_text("📄 Inserting pages...")
@@ -447,75 +770,91 @@ async def process_insert_page(update, session):
     img.save(img_pdf, 'PDF', resolution=100.0)
     img_pdf.seek(0)
     
-    for pdf_data in session['pdfs']:
-        reader = PdfReader(io.BytesIO(pdf_data['data']))
-        writer = PdfWriter()
-        
-        img_reader = PdfReader(img_pdf)
-        
-        for i in range(len(reader.pages)):
-            if i == position - 1:
-                writer.add_page(img_reader.pages[0])
-            writer.add_page(reader.pages[i])
-        
-        output = io.BytesIO()
-        writer.write(output)
-        output.seek(0)
-        
-        await update.message.reply_document(
-            document=output,
-            filename=f"inserted_{pdf_data['name']}"
-        )
+    try:
+        async with batch_output(update.message, session, 'inserted') as batch:
+            for pdf_data in session['pdfs']:
+                reader = PdfReader(io.BytesIO(pdf_data['data']))
+                writer = PdfWriter()
+                
+                img_reader = PdfReader(img_pdf)
+                
+                for i in range(len(reader.pages)):
+                    if i == position - 1:
+                        writer.add_page(img_reader.pages[0])
+                    writer.add_page(reader.pages[i])
+                
+                output = io.BytesIO()
+                writer.write(output)
+                
+                await batch.add(f"inserted_{pdf_data['name']}", data=output.getvalue())
+    finally:
+        session['mode'] = None
     
-    session['mode'] = None
-    await update.message.reply_text("✅ Pages inserted!")
+    if not batch.failed:
+        await update.message.reply_text("✅ Pages inserted!")
 
 async def process_find_replace(update, session, replace_word):
+    if not selected_pdfs(session):
+        session['mode'] = None
+        await update.message.reply_text(f"❌ No uploaded PDFs match documents: {session['doc_range']}")
+        return
+    
     await update.message.reply_text("🔄 Finding and replacing...")
     
     find_word = session['temp_data']['find_word']
+    processed = 0
+    try:
+        async with batch_output(update.message, session, 'replaced') as batch:
+            for pdf_data in selected_pdfs(session):
+                doc = fitz.open(stream=pdf_data['data'], filetype="pdf")
+                page_count = doc.page_count
+                target_pages = selected_pages(session, page_count)
+                if not target_pages:
+                    doc.close()
+                    await update.message.reply_text(
+                        f"❌ Pages {session['page_range']} not in {pdf_data['name']} ({page_count} pages)"
+                    )
+                    continue
+                processed += 1
+                
+                for page_num in target_pages:
+                    page = doc[page_num]
+                    text_instances = page.search_for(find_word)
+                    
+                    for inst in text_instances:
+                        page.add_redact_annot(inst, fill=(1, 1, 1))
+                    page.apply_redactions()
+                    
+                    for inst in text_instances:
+                        page.insert_text(inst.tl, replace_word, fontsize=10)
+                
+                output = io.BytesIO()
+                doc.save(output)
+                doc.close()
+                
+                await batch.add(f"replaced_{pdf_data['name']}", data=output.getvalue())
+    finally:
+        session['mode'] = None
     
-    for pdf_data in session['pdfs']:
-        doc = fitz.open(stream=pdf_data['data'], filetype="pdf")
-        
-        for page in doc:
-            text_instances = page.search_for(find_word)
-            
-            for inst in text_instances:
-                page.add_redact_annot(inst, fill=(1, 1, 1))
-            page.apply_redactions()
-            
-            for inst in text_instances:
-                page.insert_text(inst.tl, replace_word, fontsize=10)
-        
-        output = io.BytesIO()
-        doc.save(output)
-        doc.close()
-        output.seek(0)
-        
-        await update.message.reply_document(
-            document=output,
-            filename=f"replaced_{pdf_data['name']}"
-        )
-    
-    session['mode'] = None
-    await update.message.reply_text("✅ Text replaced!")
+    if processed and not batch.failed:
+        await update.message.reply_text("✅ Text replaced!")
 
 async def process_rename(update, session, pattern):
     await update.message.reply_text("📛 Renaming files...")
     
-    for idx, pdf_data in enumerate(session['pdfs']):
-        new_name = pattern.replace('{n}', str(idx + 1))
-        if not new_name.endswith('.pdf'):
-            new_name += '.pdf'
-        
-        await update.message.reply_document(
-            document=io.BytesIO(pdf_data['data']),
-            filename=new_name
-        )
+    try:
+        async with batch_output(update.message, session, 'renamed') as batch:
+            for idx, pdf_data in enumerate(session['pdfs']):
+                new_name = pattern.replace('{n}', str(idx + 1))
+                if not new_name.endswith('.pdf'):
+                    new_name += '.pdf'
+                
+                await batch.add(new_name, data=pdf_data['data'])
+    finally:
+        session['mode'] = None
     
-    session['mode'] = None
-    await update.message.reply_text("✅ Files renamed!")
+    if not batch.failed:
+        await update.message.reply_text("✅ Files renamed!")
 
 async def process_create_thumbnail(update, session, img_bytes):
     await update.message.reply_text("🎨 Creating thumbnails...")
@@ -528,48 +867,46 @@ async def process_create_thumbnail(update, session, img_bytes):
     img.save(thumb_pdf, 'PDF')
     thumb_pdf.seek(0)
     
-    for pdf_data in session['pdfs']:
-        doc = fitz.open(stream=pdf_data['data'], filetype="pdf")
-        
-        metadata = doc.metadata
-        metadata['thumbnail'] = thumb_pdf.getvalue()
-        doc.set_metadata(metadata)
-        
-        output = io.BytesIO()
-        doc.save(output)
-        doc.close()
-        output.seek(0)
-        
-        await update.message.reply_document(
-            document=output,
-            filename=f"thumb_{pdf_data['name']}"
-        )
+    try:
+        async with batch_output(update.message, session, 'thumbnails') as batch:
+            for pdf_data in session['pdfs']:
+                doc = fitz.open(stream=pdf_data['data'], filetype="pdf")
+                
+                metadata = doc.metadata
+                metadata['thumbnail'] = thumb_pdf.getvalue()
+                doc.set_metadata(metadata)
+                
+                output = io.BytesIO()
+                doc.save(output)
+                doc.close()
+                
+                await batch.add(f"thumb_{pdf_data['name']}", data=output.getvalue())
+    finally:
+        session['mode'] = None
     
-    session['mode'] = None
-    await update.message.reply_text("✅ Thumbnails created!")
+    if not batch.failed:
+        await update.message.reply_text("✅ Thumbnails created!")
 
 async def process_remove_thumbnail(query, session):
-    await query.edit_message_text("🗑️ Removing thumbnails...")
-    
-    for pdf_data in session['pdfs']:
-        doc = fitz.open(stream=pdf_data['data'], filetype="pdf")
-        
-        metadata = doc.metadata
-        if 'thumbnail' in metadata:
-            del metadata['thumbnail']
-        doc.set_metadata(metadata)
-        
-        output = io.BytesIO()
-        doc.save(output)
-        doc.close()
-        output.seek(0)
-        
-        await query.message.reply_document(
-            document=output,
-            filename=f"no_thumb_{pdf_data['name']}"
-        )
+    await query.edit_message_text("🗑️ Removing thumbnails..." + range_note(session, applied=False))
     
-    session['mode'] = None
+    try:
+        async with batch_output(query.message, session, 'no_thumbnails') as batch:
+            for pdf_data in session['pdfs']:
+                doc = fitz.open(stream=pdf_data['data'], filetype="pdf")
+                
+                metadata = doc.metadata
+                if 'thumbnail' in metadata:
+                    del metadata['thumbnail']
+                doc.set_metadata(metadata)
+                
+                output = io.BytesIO()
+                doc.save(output)
+                doc.close()
+                
+                await batch.add(f"no_thumb_{pdf_data['name']}", data=output.getvalue())
+    finally:
+        session['mode'] = None
 
 async def process_video_thumbnails(update, session, context):
     await update.message.reply_text("🎬 Processing video thumbnails...")
@@ -578,46 +915,44 @@ async def process_video_thumbnails(update, session, context):
     thumb_img = Image.open(io.BytesIO(thumb_bytes))
     thumb_img = thumb_img.convert('RGB')
     
-    for video_data in session['videos']:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_in:
-            tmp_in.write(video_data['data'])
-            tmp_in_path = tmp_in.name
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_thumb:
-            thumb_img.save(tmp_thumb.name, 'JPEG')
-            tmp_thumb_path = tmp_thumb.name
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_out:
-            tmp_out_path = tmp_out.name
-        
-        try:
-            clip = VideoFileClip(tmp_in_path)
-            duration = min(2, clip.duration)
-            
-            thumb_clip = ImageClip(tmp_thumb_path).set_duration(duration)
-            thumb_clip = thumb_clip.resize(height=clip.h)
-            
-            os.system(f'ffmpeg -i {tmp_in_path} -i {tmp_thumb_path} -map 0 -map 1 -c copy -disposition:v:1 attached_pic {tmp_out_path} -y')
-            
-            with open(tmp_out_path, 'rb') as f:
-                output_bytes = f.read()
-            
-            await update.message.reply_video(
-                video=io.BytesIO(output_bytes),
-                filename=f"thumb_{video_data['name']}"
-            )
-            
-            clip.close()
-        except Exception as e:
-            await update.message.reply_text(f"❌ Error: {video_data['name']}")
-        finally:
-            os.unlink(tmp_in_path)
-            os.unlink(tmp_thumb_path)
-            if os.path.exists(tmp_out_path):
-                os.unlink(tmp_out_path)
-    
-    session['mode'] = None
-    await update.message.reply_text("✅ Video thumbnails updated!")
+    try:
+        async with batch_output(update.message, session, 'video_thumbnails') as batch:
+            for video_data in session['videos']:
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_in:
+                    tmp_in.write(video_data['data'])
+                    tmp_in_path = tmp_in.name
+                
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_thumb:
+                    thumb_img.save(tmp_thumb.name, 'JPEG')
+                    tmp_thumb_path = tmp_thumb.name
+                
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_out:
+                    tmp_out_path = tmp_out.name
+                
+                try:
+                    clip = VideoFileClip(tmp_in_path)
+                    duration = min(2, clip.duration)
+                    
+                    thumb_clip = ImageClip(tmp_thumb_path).set_duration(duration)
+                    thumb_clip = thumb_clip.resize(height=clip.h)
+                    
+                    os.system(f'ffmpeg -i {tmp_in_path} -i {tmp_thumb_path} -map 0 -map 1 -c copy -disposition:v:1 attached_pic {tmp_out_path} -y')
+                    
+                    await batch.add(f"thumb_{video_data['name']}", path=tmp_out_path, video=True)
+                    
+                    clip.close()
+                except Exception as e:
+                    await update.message.reply_text(f"❌ Error: {video_data['name']}")
+                finally:
+                    os.unlink(tmp_in_path)
+                    os.unlink(tmp_thumb_path)
+                    if os.path.exists(tmp_out_path):
+                        os.unlink(tmp_out_path)
+    finally:
+        session['mode'] = None
+    
+    if not batch.failed:
+        await update.message.reply_text("✅ Video thumbnails updated!")
 
 async def process_video_thumbnails_with_watermark(update, session, context):
     await update.message.reply_text("🎬 Processing with watermark...")
@@ -632,48 +967,46 @@ async def process_video_thumbnails_with_watermark(update, session, context):
         thumb_img.save(tmp_thumb.name, 'JPEG')
         tmp_thumb_path = tmp_thumb.name
     
-    for video_data in session['videos']:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_in:
-            tmp_in.write(video_data['data'])
-            tmp_in_path = tmp_in.name
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_out:
-            tmp_out_path = tmp_out.name
-        
-        try:
-            clip = VideoFileClip(tmp_in_path)
-            
-            txt_clip = TextClip(watermark_text, fontsize=24, color='white', 
-                              font='Arial', stroke_color='black', stroke_width=1)
-            txt_clip = txt_clip.set_position(('center', 'bottom')).set_duration(clip.duration)
-            
-            final = CompositeVideoClip([clip, txt_clip])
-            final.write_videofile(tmp_out_path, codec='libx264', audio_codec='aac')
-            
-            os.system(f'ffmpeg -i {tmp_out_path} -i {tmp_thumb_path} -map 0 -map 1 -c copy -disposition:v:1 attached_pic {tmp_out_path}_final.mp4 -y')
-            
-            with open(f'{tmp_out_path}_final.mp4', 'rb') as f:
-                output_bytes = f.read()
-            
-            await update.message.reply_video(
-                video=io.BytesIO(output_bytes),
-                filename=f"watermarked_{video_data['name']}"
-            )
-            
-            clip.close()
-            final.close()
-        except Exception as e:
-            await update.message.reply_text(f"❌ Error: {video_data['name']}")
-        finally:
-            os.unlink(tmp_in_path)
-            if os.path.exists(tmp_out_path):
-                os.unlink(tmp_out_path)
-            if os.path.exists(f'{tmp_out_path}_final.mp4'):
-                os.unlink(f'{tmp_out_path}_final.mp4')
-    
-    os.unlink(tmp_thumb_path)
-    session['mode'] = None
-    await update.message.reply_text("✅ Videos processed!")
+    try:
+        async with batch_output(update.message, session, 'watermarked_videos') as batch:
+            for video_data in session['videos']:
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_in:
+                    tmp_in.write(video_data['data'])
+                    tmp_in_path = tmp_in.name
+                
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_out:
+                    tmp_out_path = tmp_out.name
+                
+                try:
+                    clip = VideoFileClip(tmp_in_path)
+                    
+                    txt_clip = TextClip(watermark_text, fontsize=24, color='white', 
+                                      font='Arial', stroke_color='black', stroke_width=1)
+                    txt_clip = txt_clip.set_position(('center', 'bottom')).set_duration(clip.duration)
+                    
+                    final = CompositeVideoClip([clip, txt_clip])
+                    final.write_videofile(tmp_out_path, codec='libx264', audio_codec='aac')
+                    
+                    os.system(f'ffmpeg -i {tmp_out_path} -i {tmp_thumb_path} -map 0 -map 1 -c copy -disposition:v:1 attached_pic {tmp_out_path}_final.mp4 -y')
+                    
+                    await batch.add(f"watermarked_{video_data['name']}", path=f'{tmp_out_path}_final.mp4', video=True)
+                    
+                    clip.close()
+                    final.close()
+                except Exception as e:
+                    await update.message.reply_text(f"❌ Error: {video_data['name']}")
+                finally:
+                    os.unlink(tmp_in_path)
+                    if os.path.exists(tmp_out_path):
+                        os.unlink(tmp_out_path)
+                    if os.path.exists(f'{tmp_out_path}_final.mp4'):
+                        os.unlink(f'{tmp_out_path}_final.mp4')
+    finally:
+        os.unlink(tmp_thumb_path)
+        session['mode'] = None
+    
+    if not batch.failed:
+        await update.message.reply_text("✅ Videos processed!")
 
 def main():
     app = Application.builder().token(BOT_TOKEN).build()